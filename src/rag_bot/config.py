@@ -14,27 +14,57 @@ load_dotenv(PROJECT_ROOT / ".env")
 DATA_ROOT = PROJECT_ROOT / "data" / "vendor"
 CHROMA_DB_DIR = PROJECT_ROOT / "data" / "chroma_db"
 UPLOAD_DIR = PROJECT_ROOT / "data" / "uploads"
+LLM_CACHE_DIR = PROJECT_ROOT / "data" / "llm_cache"
+DOC_INDEX_PATH = PROJECT_ROOT / "data" / "doc_index.json"
+BM25_INDEX_DIR = CHROMA_DB_DIR / "bm25_index"
+UPLOAD_HASHES_DB = PROJECT_ROOT / "data" / "uploaded_hashes.sqlite"
 
 # Ensure directories exist
 DATA_ROOT.mkdir(parents=True, exist_ok=True)
 CHROMA_DB_DIR.mkdir(parents=True, exist_ok=True)
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 # LLM config — supports: groq, anthropic, gemini, openai
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
 LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
 LLM_API_KEY = os.getenv("LLM_API_KEY", "")
 
+# Model context window in tokens; retrieved context is trimmed to fit it
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "32768"))
+
+# Exact-match LLM response cache (seconds before a cached answer expires)
+LLM_CACHE_TTL = 7 * 24 * 3600
+
 # Legacy aliases
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-20250514")
 
 # Embedding model
 EMBED_MODEL_NAME = "BAAI/bge-base-en-v1.5"
+# Token limit for query embeddings; questions are short, so truncating here
+# saves encoder work. Documents are embedded at the model's full length.
+QUERY_MAX_SEQ_LENGTH = 64
 
 # ChromaDB collection name
 COLLECTION_NAME = "infra_docs"
 
+# Semantic answer cache (near-duplicate questions reuse a previous answer)
+SEMANTIC_CACHE_COLLECTION = "qa_semantic_cache"
+SEMANTIC_CACHE_THRESHOLD = 0.97  # minimum cosine similarity for a hit
+SEMANTIC_CACHE_MAX_ENTRIES = 10_000
+
+# In-memory cache of hybrid_retrieve results for near-duplicate queries
+RETRIEVAL_CACHE_SIZE = 512
+RETRIEVAL_CACHE_THRESHOLD = 0.95  # minimum cosine similarity for a hit
+
+# Adaptive hybrid: answer from vector search alone, without waiting for BM25 or
+# fusing, when the top hit is close (squared L2 between unit vectors) and
+# clearly ahead of the runner-up. BM25 still starts alongside vector search.
+ADAPTIVE_HYBRID = True
+ADAPTIVE_HYBRID_MAX_DISTANCE = 0.2
+ADAPTIVE_HYBRID_MIN_MARGIN = 0.5  # (d1 - d0) / d0
+
 # Vendor documents catalog
 VENDOR_DOCUMENTS = {
     "Dell": [
@@ -0,0 +1,133 @@
+"""
+In-process index of ingested documents: (vendor, document) -> chunk ids and pages.
+
+Avoids scanning every metadata in ChromaDB on /documents and /documents DELETE.
+The index is persisted to DOC_INDEX_PATH and rebuilt from the collection with a
+single scan whenever its chunk total no longer matches collection.count().
+"""
+
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from rag_bot.config import DOC_INDEX_PATH
+from rag_bot.retrieval.retriever import get_collection
+
+
+DocKey = Tuple[str, str]
+
+
+class DocumentIndex:
+    """Maintains per-document chunk ids and page sets."""
+
+    def __init__(self, path=DOC_INDEX_PATH):
+        self._path = path
+        # (vendor, document) -> {"ids": set of chunk ids, "pages": set of pages}
+        self._docs: Optional[Dict[DocKey, Dict]] = None
+        self._lock = threading.Lock()
+
+    def list_documents(self) -> List[Dict]:
+        """Return one summary dict per document, sorted by vendor/document."""
+        with self._lock:
+            docs = self._loaded()
+            return [
+                {
+                    "vendor": vendor,
+                    "document": document,
+                    "chunk_count": len(info["ids"]),
+                    "page_count": len(info["pages"]),
+                }
+                for (vendor, document), info in sorted(
+                    docs.items(), key=lambda item: f"{item[0][0]}/{item[0][1]}"
+                )
+            ]
+
+    def total_chunks(self) -> int:
+        with self._lock:
+            return self._total(self._loaded())
+
+    def get_ids(self, vendor: str, document: str) -> List[str]:
+        """Return every chunk id stored for a document (empty if unknown)."""
+        with self._lock:
+            info = self._loaded().get((vendor, document))
+            return sorted(info["ids"]) if info else []
+
+    def add(self, metadatas: List[Dict], ids: List[str]):
+        """Record newly ingested chunks."""
+        with self._lock:
+            docs = self._loaded()
+            for meta, chunk_id in zip(metadatas, ids):
+                self._add_one(docs, meta, chunk_id)
+            self._save()
+
+    def remove(self, vendor: str, document: str):
+        """Forget a deleted document."""
+        with self._lock:
+            if self._loaded().pop((vendor, document), None) is not None:
+                self._save()
+
+    # ─── Internals ───────────────────────────────────────────────────────
+
+    def _loaded(self) -> Dict[DocKey, Dict]:
+        if self._docs is None:
+            self._docs = self._load()
+            if self._docs is None or self._total(self._docs) != get_collection().count():
+                self._docs = self._scan()
+                self._save()
+        return self._docs
+
+    @staticmethod
+    def _total(docs: Dict[DocKey, Dict]) -> int:
+        return sum(len(info["ids"]) for info in docs.values())
+
+    @staticmethod
+    def _add_one(docs: Dict[DocKey, Dict], meta: Dict, chunk_id: str):
+        key = (meta.get("vendor", "Unknown"), meta.get("document", "Unknown"))
+        info = docs.setdefault(key, {"ids": set(), "pages": set()})
+        info["ids"].add(chunk_id)
+        page = meta.get("page")
+        if page is not None:
+            info["pages"].add(page)
+
+    def _scan(self) -> Dict[DocKey, Dict]:
+        """Rebuild the index with one full scan of the collection."""
+        all_data = get_collection().get(include=["metadatas"])
+        docs: Dict[DocKey, Dict] = {}
+        for meta, chunk_id in zip(all_data.get("metadatas", []), all_data.get("ids", [])):
+            self._add_one(docs, meta or {}, chunk_id)
+        return docs
+
+    def _load(self) -> Optional[Dict[DocKey, Dict]]:
+        if not self._path.exists():
+            return None
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return {
+            (entry["vendor"], entry["document"]): {
+                "ids": set(entry["ids"]),
+                "pages": set(entry["pages"]),
+            }
+            for entry in raw
+        }
+
+    def _save(self):
+        raw = [
+            {
+                "vendor": vendor,
+                "document": document,
+                "ids": sorted(info["ids"]),
+                "pages": sorted(info["pages"], key=str),
+            }
+            for (vendor, document), info in self._docs.items()
+        ]
+        tmp_path = self._path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(raw, f)
+        tmp_path.replace(self._path)
+
+
+# Global singleton
+doc_index = DocumentIndex()
@@ -0,0 +1,74 @@
+"""
+Exact-match LLM response cache: in-process LRU in front of a persistent diskcache.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+import diskcache
+
+from rag_bot.config import LLM_CACHE_DIR, LLM_CACHE_TTL
+
+
+# Number of responses kept in the in-process hot tier
+HOT_CACHE_SIZE = 256
+
+_hot: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_disk = diskcache.Cache(str(LLM_CACHE_DIR))
+
+
+def make_key(
+    provider: str,
+    model: str,
+    system: str,
+    messages: List[Dict],
+    max_tokens: int,
+) -> str:
+    """Hash everything that determines the LLM output into a cache key."""
+    payload = "|".join([
+        provider,
+        model,
+        str(max_tokens),
+        system,
+        json.dumps(messages, sort_keys=True, ensure_ascii=False),
+    ])
+    return hashlib.blake2b(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    """Return the cached response for key, or None on a miss."""
+    entry = _hot.get(key)
+    if entry is not None:
+        expires_at, value = entry
+        if expires_at > time.time():
+            _hot.move_to_end(key)
+            return value
+        _hot.pop(key, None)
+
+    value, expires_at = _disk.get(key, expire_time=True)
+    if value is not None:
+        # Keep the disk entry's expiry, so the hot copy can't outlive it
+        _remember(key, value, expires_at or time.time() + LLM_CACHE_TTL)
+    return value
+
+
+def put(key: str, value: str):
+    """Store a response in both cache tiers."""
+    _disk.set(key, value, expire=LLM_CACHE_TTL)
+    _remember(key, value, time.time() + LLM_CACHE_TTL)
+
+
+def clear():
+    """Drop every cached response."""
+    _hot.clear()
+    _disk.clear()
+
+
+def _remember(key: str, value: str, expires_at: float):
+    _hot[key] = (expires_at, value)
+    _hot.move_to_end(key)
+    while len(_hot) > HOT_CACHE_SIZE:
+        _hot.popitem(last=False)
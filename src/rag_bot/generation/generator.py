@@ -2,97 +2,349 @@
 Multi-model LLM generation — supports Groq, Anthropic, Gemini, OpenAI.
 """
 
-from typing import List, Dict, Optional
-from rag_bot.config import LLM_PROVIDER, LLM_MODEL, LLM_API_KEY
+import hashlib
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 
+import httpx
+import tiktoken
 
-def _call_llm(system: str, messages: List[Dict], max_tokens: int = 4096) -> str:
-    """Route to the correct LLM provider."""
-    provider = LLM_PROVIDER.lower()
+from rag_bot.config import LLM_PROVIDER, LLM_MODEL, LLM_API_KEY, LLM_CONTEXT_WINDOW
+from rag_bot.generation import _llm_cache
+
+
+MAX_OUTPUT_TOKENS = 4096
+
+# Shared keep-alive pool for provider APIs, so each request reuses an open
+# TLS connection instead of paying a fresh handshake. The long read timeout
+# matches the SDK defaults for multi-thousand-token generations.
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=50)
+_HTTP_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
 
-    if provider == "groq":
-        from groq import Groq
-        client = Groq(api_key=LLM_API_KEY)
-        full_messages = [{"role": "system", "content": system}] + messages
-        response = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=full_messages,
-            max_tokens=max_tokens,
-        )
-        return response.choices[0].message.content
 
+def _http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+
+
+def _make_client(provider: str):
+    """Import only the configured provider's SDK and build its async client."""
+    if provider == "groq":
+        from groq import AsyncGroq
+        return AsyncGroq(api_key=LLM_API_KEY, http_client=_http_client())
     elif provider == "anthropic":
         import anthropic
-        client = anthropic.Anthropic(api_key=LLM_API_KEY)
-        response = client.messages.create(
-            model=LLM_MODEL,
-            max_tokens=max_tokens,
-            system=system,
-            messages=messages,
-        )
-        return response.content[0].text
-
+        return anthropic.AsyncAnthropic(api_key=LLM_API_KEY, http_client=_http_client())
     elif provider == "gemini":
         import google.generativeai as genai
         genai.configure(api_key=LLM_API_KEY)
-        model = genai.GenerativeModel(LLM_MODEL, system_instruction=system)
-        prompt = "\n\n".join(m["content"] for m in messages)
-        response = model.generate_content(prompt)
-        return response.text
-
+        return genai
     elif provider == "openai":
-        from openai import OpenAI
-        client = OpenAI(api_key=LLM_API_KEY)
-        full_messages = [{"role": "system", "content": system}] + messages
-        response = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=full_messages,
-            max_tokens=max_tokens,
-        )
-        return response.choices[0].message.content
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=LLM_API_KEY, http_client=_http_client())
+    return None
 
-    else:
-        raise ValueError(f"Unsupported LLM provider: {provider}")
 
+async def _call_chat_completions(system: str, messages: List[Dict], max_tokens: int) -> str:
+    """Groq and OpenAI share the chat-completions API."""
+    full_messages = [{"role": "system", "content": system}] + messages
+    response = await _CLIENT.chat.completions.create(
+        model=LLM_MODEL,
+        messages=full_messages,
+        max_tokens=max_tokens,
+    )
+    return response.choices[0].message.content
 
-def build_system_prompt() -> str:
-    return (
-        "You are an expert IT infrastructure assistant specializing in enterprise networking, "
-        "servers, firewalls, and end-user computing. You have access to documentation from vendors "
-        "including Cisco, Juniper, Fortinet, Dell, IBM, and others.\n\n"
-        "Guidelines:\n"
-        "- Answer questions clearly and concisely based on the provided context\n"
-        "- Cite specific documents and pages when possible\n"
-        "- If the context doesn't contain enough information, say so honestly\n"
-        "- Use technical terminology appropriately\n"
-        "- Format responses with markdown when helpful (headers, lists, code blocks)\n"
+
+async def _call_anthropic(system: str, messages: List[Dict], max_tokens: int) -> str:
+    response = await _CLIENT.messages.create(
+        model=LLM_MODEL,
+        max_tokens=max_tokens,
+        system=[{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
+        messages=_with_history_breakpoint(messages),
+    )
+    return response.content[0].text
+
+
+async def _call_gemini(system: str, messages: List[Dict], max_tokens: int) -> str:
+    model = _CLIENT.GenerativeModel(LLM_MODEL, system_instruction=system)
+    prompt = "\n\n".join(m["content"] for m in messages)
+    response = await model.generate_content_async(prompt)
+    return response.text
+
+
+async def _stream_chat_completions(system: str, messages: List[Dict], max_tokens: int):
+    full_messages = [{"role": "system", "content": system}] + messages
+    stream = await _CLIENT.chat.completions.create(
+        model=LLM_MODEL,
+        messages=full_messages,
+        max_tokens=max_tokens,
+        stream=True,
     )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
 
-def generate_answer(
+async def _stream_anthropic(system: str, messages: List[Dict], max_tokens: int):
+    async with _CLIENT.messages.stream(
+        model=LLM_MODEL,
+        max_tokens=max_tokens,
+        system=[{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
+        messages=_with_history_breakpoint(messages),
+    ) as stream:
+        async for text in stream.text_stream:
+            yield text
+
+
+async def _stream_gemini(system: str, messages: List[Dict], max_tokens: int):
+    model = _CLIENT.GenerativeModel(LLM_MODEL, system_instruction=system)
+    prompt = "\n\n".join(m["content"] for m in messages)
+    response = await model.generate_content_async(prompt, stream=True)
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+
+_PROVIDERS = {
+    "groq": _call_chat_completions,
+    "anthropic": _call_anthropic,
+    "gemini": _call_gemini,
+    "openai": _call_chat_completions,
+}
+
+_STREAM_PROVIDERS = {
+    "groq": _stream_chat_completions,
+    "anthropic": _stream_anthropic,
+    "gemini": _stream_gemini,
+    "openai": _stream_chat_completions,
+}
+
+# Resolved once at import: the selected provider, its SDK client and call path
+_PROVIDER = LLM_PROVIDER.lower()
+_CLIENT = _make_client(_PROVIDER)
+
+
+async def _call_llm(
+    system: str,
+    messages: List[Dict],
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+) -> str:
+    """Return a cached response when the exact same prompt was seen before."""
+    key = _llm_cache.make_key(_PROVIDER, LLM_MODEL, system, messages, max_tokens)
+    cached = _llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    answer = await _call_provider(system, messages, max_tokens)
+    if answer:
+        _llm_cache.put(key, answer)
+    return answer
+
+
+async def _stream_llm(
+    system: str,
+    messages: List[Dict],
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+) -> AsyncIterator[str]:
+    """
+    Yield the response as text deltas. A cached response is yielded whole;
+    otherwise the streamed deltas are collected and cached once complete.
+    """
+    key = _llm_cache.make_key(_PROVIDER, LLM_MODEL, system, messages, max_tokens)
+    cached = _llm_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = _STREAM_PROVIDERS.get(_PROVIDER)
+    if stream is None:
+        raise ValueError(f"Unsupported LLM provider: {_PROVIDER}")
+
+    parts = []
+    async for delta in stream(system, messages, max_tokens):
+        parts.append(delta)
+        yield delta
+    answer = "".join(parts)
+    if answer:
+        _llm_cache.put(key, answer)
+
+
+async def _call_provider(system: str, messages: List[Dict], max_tokens: int = MAX_OUTPUT_TOKENS) -> str:
+    """Route to the correct LLM provider."""
+    call = _PROVIDERS.get(_PROVIDER)
+    if call is None:
+        raise ValueError(f"Unsupported LLM provider: {_PROVIDER}")
+    return await call(system, messages, max_tokens)
+
+
+def _with_history_breakpoint(messages: List[Dict]) -> List[Dict]:
+    """
+    Mark the last prior turn as an Anthropic prompt-cache breakpoint so the
+    system prompt + conversation history prefix is reused on the next turn.
+    """
+    if len(messages) < 2:
+        return messages
+    last = messages[-2]
+    marked = {
+        "role": last["role"],
+        "content": [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}],
+    }
+    return messages[:-2] + [marked, messages[-1]]
+
+
+SYSTEM_PROMPT = (
+    "You are an expert IT infrastructure assistant specializing in enterprise networking, "
+    "servers, firewalls, and end-user computing. You have access to documentation from vendors "
+    "including Cisco, Juniper, Fortinet, Dell, IBM, and others.\n\n"
+    "Guidelines:\n"
+    "- Answer questions clearly and concisely based on the provided context\n"
+    "- Cite specific documents and pages when possible\n"
+    "- If the context doesn't contain enough information, say so honestly\n"
+    "- Use technical terminology appropriately\n"
+    "- Format responses with markdown when helpful (headers, lists, code blocks)\n"
+)
+
+
+def build_system_prompt() -> str:
+    return SYSTEM_PROMPT
+
+
+_encoder: Optional[tiktoken.Encoding] = None
+
+
+def _get_encoder(model: str) -> tiktoken.Encoding:
+    """Tokenizer for the model (cl100k_base for non-OpenAI models), built once."""
+    global _encoder
+    if _encoder is None:
+        try:
+            _encoder = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encoder = tiktoken.get_encoding("cl100k_base")
+    return _encoder
+
+
+def _count_tokens(text: str) -> int:
+    return len(_get_encoder(LLM_MODEL).encode(text, disallowed_special=()))
+
+
+def _fit_to_budget(chunks: List[str], model: str, budget_tokens: int) -> List[str]:
+    """
+    Keep the leading chunks that fit within budget_tokens. If even the first
+    chunk is too long it is truncated, so there is always some context.
+    """
+    enc = _get_encoder(model)
+    kept: List[str] = []
+    used = 0
+    for chunk in chunks:
+        tokens = enc.encode(chunk, disallowed_special=())
+        if used + len(tokens) > budget_tokens:
+            if not kept and budget_tokens > 0:
+                kept.append(enc.decode(tokens[:budget_tokens]))
+            break
+        kept.append(chunk)
+        used += len(tokens)
+    return kept
+
+
+def _context_budget(fixed_tokens: int) -> int:
+    """Tokens left for retrieved context after fixed_tokens of prompt, keeping a 10% safety margin."""
+    return int((LLM_CONTEXT_WINDOW - MAX_OUTPUT_TOKENS - fixed_tokens) * 0.9)
+
+
+def _trim_history(
+    messages: List[Dict], system: str, question: str, first_chunk: str
+) -> Tuple[List[Dict], int]:
+    """
+    Drop the oldest history turns until the top-ranked chunk fits in the
+    context budget, so a long conversation never crowds out all context.
+    Returns (messages, context budget).
+    """
+    base = _count_tokens(system) + _count_tokens(question)
+    counts = [_count_tokens(m["content"]) for m in messages]
+    history_tokens = sum(counts)
+    needed = _count_tokens(first_chunk)
+    start = 0
+    while start < len(messages) and _context_budget(base + history_tokens) < needed:
+        # Drop a whole turn, so the remaining history still starts with a user message
+        history_tokens -= counts[start]
+        start += 1
+        while start < len(messages) and messages[start]["role"] != "user":
+            history_tokens -= counts[start]
+            start += 1
+    return messages[start:], _context_budget(base + history_tokens)
+
+
+def _dedup_chunks(chunks: List[str], metadatas: List[Dict]) -> Tuple[List[str], List[Dict]]:
+    """Drop repeated chunk texts, keeping the first (highest-ranked) occurrence."""
+    seen = set()
+    kept_chunks, kept_metas = [], []
+    for chunk, meta in zip(chunks, metadatas):
+        digest = hashlib.blake2b(chunk.encode("utf-8"), digest_size=8).digest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        kept_chunks.append(chunk)
+        kept_metas.append(meta)
+    return kept_chunks, kept_metas
+
+
+def _source_order(meta: Dict) -> Tuple:
+    """Sort key (vendor, document, page, chunk); numeric pages sort numerically."""
+    page = meta.get("page")
+    page_key = (0, page, "") if isinstance(page, int) else (1, 0, str(page))
+    return (meta.get("vendor", ""), meta.get("document", ""), page_key, meta.get("chunk") or 0)
+
+
+def build_answer_prompt(
     question: str,
     context_chunks: List[str],
     metadatas: List[Dict],
     conversation_history: Optional[List[Dict]] = None,
     system_prompt: Optional[str] = None,
-) -> str:
+) -> Tuple[str, List[Dict], List[Dict]]:
+    """
+    Build the prompt for an answer: dedup the retrieved chunks, fit them to the
+    context budget and order them by source.
+    Returns (system, messages, metadatas), where metadatas[i] is the chunk
+    cited as [Source i+1] in the prompt — build the response's sources from it.
+    """
+    system = system_prompt or build_system_prompt()
+    # Stable prefix first: prior turns are kept verbatim (raw questions, no
+    # context) so providers can reuse their prompt cache; only the new turn
+    # carries the freshly retrieved context.
+    messages = []
+    if conversation_history:
+        messages.extend({"role": m["role"], "content": m["content"]} for m in conversation_history)
+
+    context_chunks, metadatas = _dedup_chunks(context_chunks, metadatas)
+    if context_chunks:
+        messages, budget = _trim_history(messages, system, question, context_chunks[0])
+        context_chunks = _fit_to_budget(context_chunks, LLM_MODEL, budget)
+    # Deterministic order, so the same retrieved set yields a byte-identical prompt
+    ordered = sorted(zip(context_chunks, metadatas), key=lambda pair: _source_order(pair[1]))
+
     context_parts = []
-    for i, (chunk, meta) in enumerate(zip(context_chunks, metadatas)):
+    for i, (chunk, meta) in enumerate(ordered):
         vendor = meta.get("vendor", "Unknown")
         doc = meta.get("document", "Unknown")
         page = meta.get("page", "n/a")
         context_parts.append(f"[Source {i+1}: {vendor} - {doc}, Page {page}]\n{chunk}")
     context_str = "\n\n".join(context_parts)
 
-    messages = []
-    if conversation_history:
-        messages.extend(conversation_history)
-
     user_message = (
         f"Context from documentation:\n\n{context_str}\n\n"
         f"Question: {question}\n\n"
         "Please answer based on the context above. Cite sources when relevant."
     )
     messages.append({"role": "user", "content": user_message})
+    return system, messages, [meta for _, meta in ordered]
+
+
+async def generate_answer(system: str, messages: List[Dict]) -> str:
+    """Answer a prompt from build_answer_prompt."""
+    return await _call_llm(system, messages)
+
 
-    return _call_llm(system_prompt or build_system_prompt(), messages)
+async def stream_answer(system: str, messages: List[Dict]) -> AsyncIterator[str]:
+    """Streaming variant of generate_answer; yields text deltas."""
+    async for delta in _stream_llm(system, messages):
+        yield delta
@@ -2,14 +2,21 @@
 FastAPI application for RAG IT Infrastructure Assistant.
 """
 
+import hashlib
+import json
 import os
 import time
 import uuid
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import aiofiles
+import numpy as np
+import torch
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
@@ -18,11 +25,14 @@ from rag_bot.config import (
     EMBED_MODEL_NAME, COLLECTION_NAME, LLM_PROVIDER, LLM_MODEL, LLM_API_KEY,
 )
 from rag_bot.retrieval.retriever import (
-    hybrid_retrieve, get_collection,
-    get_embedder, reload_collection,
+    hybrid_retrieve, encode_query, get_collection,
+    get_embedder, reload_collection, chroma_client,
 )
-from rag_bot.generation.generator import generate_answer
+from rag_bot.generation.generator import build_answer_prompt, generate_answer, stream_answer
 from rag_bot.session_manager import session_manager
+from rag_bot.semantic_cache import semantic_cache
+from rag_bot.doc_index import doc_index
+from rag_bot.upload_registry import upload_registry
 from rag_bot.ingestion.pdf_loader import extract_pdf_text, chunk_text as chunk_text_pdf
 from rag_bot.ingestion.html_loader import extract_html_text, chunk_text as chunk_text_html
 
@@ -45,6 +55,16 @@ app.add_middleware(
 )
 
 
+NO_RESULTS_ANSWER = "❌ No relevant information found in the indexed documents."
+
+# Upload ingestion: embedding forward-pass batch size (larger on GPU), and the
+# /upload-batch flush triggers (pending chunk count / seconds since the last flush)
+EMBED_BATCH_SIZE = 256 if torch.cuda.is_available() else 64
+UPLOAD_FLUSH_CHUNKS = 256
+UPLOAD_FLUSH_SECONDS = 5.0
+UPLOAD_COPY_CHUNK_SIZE = 1 << 20  # bytes read per step when saving an upload
+
+
 # ─── Request/Response Models ─────────────────────────────────────────────────
 
 class MessageItem(BaseModel):
@@ -55,6 +75,7 @@ class QueryRequest(BaseModel):
     question: str
     session_id: Optional[str] = None
     top_k: Optional[int] = 5
+    vendor: Optional[str] = None
     conversation_history: Optional[List[MessageItem]] = None
 
 class SourceInfo(BaseModel):
@@ -113,6 +134,268 @@ def _parse_sources(metadatas: List[Dict]) -> List[SourceInfo]:
     ]
 
 
+def _resolve_history(request: QueryRequest, session_id: str) -> List[Dict]:
+    """Conversation history from the request, else from the stored session."""
+    if request.conversation_history:
+        return [{"role": m.role, "content": m.content} for m in request.conversation_history]
+    if request.session_id:
+        return session_manager.get_history(session_id)
+    return []
+
+
+def _is_cacheable(vendor: Optional[str], history: List[Dict]) -> bool:
+    """
+    Only stand-alone, unfiltered questions use the semantic cache: a follow-up
+    depends on its conversation and a vendor-scoped answer on its filter.
+    """
+    return not history and vendor is None
+
+
+async def _embed_and_lookup(question: str, top_k: int, cacheable: bool):
+    """
+    Embed the question once (reused for retrieval) and check the semantic
+    cache for an answer built from the same top_k when the question is cacheable.
+    Returns (question_embedding, cached, cache_generation); cache_generation
+    is None for questions that must not be cached.
+    """
+    question_embedding = await run_in_threadpool(encode_query, question)
+    if not cacheable:
+        return question_embedding, None, None
+    # Read before retrieval, so an answer from a since-replaced corpus isn't stored
+    cache_generation = semantic_cache.generation
+    cached = await run_in_threadpool(semantic_cache.lookup, question_embedding, top_k)
+    return question_embedding, cached, cache_generation
+
+
+async def _semantic_store(
+    question: str,
+    question_embedding: np.ndarray,
+    top_k: int,
+    cache_generation: Optional[int],
+    answer: str,
+    sources: List[SourceInfo],
+):
+    if cache_generation is None:
+        return
+    await run_in_threadpool(
+        semantic_cache.store,
+        question,
+        question_embedding,
+        answer,
+        [s.dict() for s in sources],
+        top_k,
+        cache_generation,
+    )
+
+
+def _record_turn(session_id: str, question: str, answer: str, response_time: float):
+    """Track the turn in the session and in analytics."""
+    session_manager.add_message(session_id, "user", question)
+    session_manager.add_message(session_id, "assistant", answer)
+    session_manager.track_query(question, response_time)
+
+
+def _sse(payload: Dict) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _check_extension(filename: str) -> str:
+    """Return the lower-cased extension, rejecting unsupported file types."""
+    ext = Path(filename).suffix.lower()
+    if ext not in (".pdf", ".html", ".htm"):
+        raise HTTPException(status_code=400, detail="Only PDF and HTML files are supported.")
+    return ext
+
+
+def _derive_vendor(vendor: str, filename: str) -> str:
+    """Use the given vendor, or auto-derive one from the filename."""
+    if vendor.strip():
+        return vendor.strip()
+    return Path(filename).stem.replace("_", " ").replace("-", " ").title()
+
+
+async def _save_upload(file: UploadFile, filename: str) -> Tuple[Path, int, str]:
+    """
+    Save an uploaded file to a temporary name in the uploads folder.
+    Returns (temp_path, size, sha256); _store_upload decides whether it is kept.
+    """
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = UPLOAD_DIR / f".{filename}.{uuid.uuid4().hex}.part"
+
+    # Stream to disk so memory stays bounded regardless of document size
+    file_size = 0
+    digest = hashlib.sha256()
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_COPY_CHUNK_SIZE):
+                digest.update(chunk)
+                await out.write(chunk)
+                file_size += len(chunk)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        await file.close()
+    return tmp_path, file_size, digest.hexdigest()
+
+
+async def _store_upload(file: UploadFile, filename: str, vendor: str, doc_vendor: str):
+    """
+    Save an upload and check it against already-ingested files. The file only
+    replaces UPLOAD_DIR/filename once it is known not to be a duplicate, so a
+    duplicate never overwrites another document's source file.
+    Returns (file_path, size, sha256, skipped): skipped is the duplicate result (and
+    file_path None), or None when the file must be ingested from file_path.
+    """
+    tmp_path, file_size, sha256 = await _save_upload(file, filename)
+    try:
+        skipped = await run_in_threadpool(_skip_duplicate, sha256, vendor, doc_vendor)
+        if skipped is not None:
+            tmp_path.unlink(missing_ok=True)
+            return None, file_size, sha256, skipped
+        file_path = UPLOAD_DIR / filename
+        tmp_path.replace(file_path)
+        return file_path, file_size, sha256, None
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _skip_duplicate(sha256: str, vendor: str, doc_vendor: str) -> Optional[Dict]:
+    """
+    If identical bytes were already ingested, skip re-embedding and return the
+    upload result. An explicitly given new vendor only rewrites chunk metadata.
+    Returns None when the file must be ingested.
+    """
+    existing = upload_registry.lookup(sha256)
+    if existing is None:
+        return None
+    ids = doc_index.get_ids(existing["vendor"], existing["filename"])
+    if not ids:
+        # Document was removed from the index since; ingest it again
+        return None
+
+    final_vendor = existing["vendor"]
+    if vendor.strip() and doc_vendor != existing["vendor"]:
+        col = get_collection()
+        metadatas = col.get(ids=ids, include=["metadatas"])
+        updated = [dict(meta, vendor=doc_vendor) for meta in metadatas["metadatas"]]
+        col.update(ids=metadatas["ids"], metadatas=updated)
+        doc_index.remove(existing["vendor"], existing["filename"])
+        doc_index.add(updated, metadatas["ids"])
+        upload_registry.update_vendor(sha256, doc_vendor)
+        _refresh_after_ingest()
+        final_vendor = doc_vendor
+
+    return {
+        "status": "skipped",
+        "reason": "duplicate",
+        "filename": existing["filename"],
+        "vendor": final_vendor,
+        "existing_chunks": len(ids),
+        "chunks_added": 0,
+    }
+
+
+def _chunk_document(
+    file_path: Path, filename: str, ext: str, doc_vendor: str
+) -> Tuple[List[str], List[Dict], List[str]]:
+    """Extract and chunk a PDF/HTML file. Returns (documents, metadatas, ids)."""
+    documents: List[str] = []
+    metadatas: List[Dict] = []
+    ids: List[str] = []
+
+    source_path = str(file_path)
+
+    if ext == ".pdf":
+        pages = extract_pdf_text(file_path)
+        for page in pages:
+            chunks = chunk_text_pdf(page["text"])
+            page_num = page["page_num"]
+            prefix = f"{doc_vendor}_{filename}_p{page_num}"
+            documents.extend(chunks)
+            metadatas.extend(
+                {
+                    "vendor": doc_vendor,
+                    "document": filename,
+                    "page": page_num,
+                    "chunk": idx,
+                    "source_path": source_path,
+                }
+                for idx in range(len(chunks))
+            )
+            ids.extend([f"{prefix}_c{idx}" for idx in range(len(chunks))])
+    else:
+        text = extract_html_text(file_path)
+        chunks = chunk_text_html(text)
+        prefix = f"{doc_vendor}_{filename}"
+        documents.extend(chunks)
+        metadatas.extend(
+            {
+                "vendor": doc_vendor,
+                "document": filename,
+                "chunk": idx,
+                "source_path": source_path,
+            }
+            for idx in range(len(chunks))
+        )
+        ids.extend([f"{prefix}_c{idx}" for idx in range(len(chunks))])
+
+    return documents, metadatas, ids
+
+
+def _drop_stale_chunks(col, metadatas: List[Dict], ids: List[str]):
+    """
+    Delete chunks of an earlier version of each document that the new version
+    doesn't overwrite (e.g. it has fewer pages), so upserting doesn't leave
+    old content mixed in with the new.
+    """
+    new_ids: Dict[Tuple[str, str], set] = {}
+    for meta, chunk_id in zip(metadatas, ids):
+        key = (meta.get("vendor", "Unknown"), meta.get("document", "Unknown"))
+        new_ids.setdefault(key, set()).add(chunk_id)
+    for (vendor, document), kept in new_ids.items():
+        stale = set(doc_index.get_ids(vendor, document)) - kept
+        if stale:
+            col.delete(ids=list(stale))
+            # Re-added with only the new chunk ids (and pages) after the upsert
+            doc_index.remove(vendor, document)
+
+
+def _ingest_chunks(documents: List[str], metadatas: List[Dict], ids: List[str]):
+    """Embed chunks in one batched pass and bulk-upsert them into ChromaDB."""
+    if not documents:
+        return
+    embeddings = get_embedder().encode(
+        documents,
+        batch_size=EMBED_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    col = get_collection()
+    _drop_stale_chunks(col, metadatas, ids)
+    # A single upsert per call, split only when exceeding Chroma's batch limit
+    max_batch = chroma_client.get_max_batch_size()
+    for start in range(0, len(documents), max_batch):
+        end = start + max_batch
+        col.upsert(
+            ids=ids[start:end],
+            documents=documents[start:end],
+            embeddings=embeddings[start:end].tolist(),
+            metadatas=metadatas[start:end],
+        )
+    doc_index.add(metadatas, ids)
+
+
+def _refresh_after_ingest() -> int:
+    """Reload the collection after writes and drop stale cached answers."""
+    reload_collection()
+    semantic_cache.clear()
+    return get_collection().count()
+
+
 # ─── Endpoints ───────────────────────────────────────────────────────────────
 
 @app.get("/health", response_model=HealthResponse)
@@ -129,42 +412,53 @@ def health_check():
 
 
 @app.post("/query", response_model=QueryResponse)
-def query_rag(request: QueryRequest):
+async def query_rag(request: QueryRequest, background_tasks: BackgroundTasks):
     """Query with hybrid search and multi-turn conversation."""
     t0 = time.time()
     try:
         # Session management
         session_id = request.session_id or session_manager.create_session()
+        history = _resolve_history(request, session_id)
+        # An empty vendor means "no filter", everywhere below
+        vendor = request.vendor or None
 
-        # Build conversation history
-        history = []
-        if request.conversation_history:
-            history = [{"role": m.role, "content": m.content} for m in request.conversation_history]
-        elif request.session_id:
-            history = session_manager.get_history(session_id)
-
-        # Hybrid retrieval
-        context_chunks, metadatas = hybrid_retrieve(request.question, top_k=request.top_k)
+        question_embedding, cached, cache_generation = await _embed_and_lookup(
+            request.question, request.top_k, _is_cacheable(vendor, history)
+        )
 
-        if not context_chunks:
-            answer = "❌ No relevant information found in the indexed documents."
-            sources = []
+        if cached is not None:
+            answer, cached_sources = cached
+            sources = [SourceInfo(**s) for s in cached_sources]
         else:
-            answer = generate_answer(
-                question=request.question,
-                context_chunks=context_chunks,
-                metadatas=metadatas,
-                conversation_history=history if history else None,
+            # Hybrid retrieval
+            context_chunks, metadatas = await run_in_threadpool(
+                hybrid_retrieve, request.question, request.top_k, question_embedding,
+                vendor,
             )
-            sources = _parse_sources(metadatas)
 
-        # Track in session
-        session_manager.add_message(session_id, "user", request.question)
-        session_manager.add_message(session_id, "assistant", answer)
+            if not context_chunks:
+                answer = NO_RESULTS_ANSWER
+                sources = []
+            else:
+                # Token counting for the context budget is CPU-bound — keep it off the event loop
+                system, messages, cited = await run_in_threadpool(
+                    build_answer_prompt,
+                    question=request.question,
+                    context_chunks=context_chunks,
+                    metadatas=metadatas,
+                    conversation_history=history if history else None,
+                )
+                answer = await generate_answer(system, messages)
+                # Same list and order as the prompt's [Source i] labels
+                sources = _parse_sources(cited)
+                await _semantic_store(
+                    request.question, question_embedding, request.top_k, cache_generation, answer, sources
+                )
 
-        # Analytics
-        response_time = time.time() - t0
-        session_manager.track_query(request.question, response_time)
+        # Session/analytics bookkeeping runs after the response is sent
+        background_tasks.add_task(
+            _record_turn, session_id, request.question, answer, time.time() - t0
+        )
 
         return QueryResponse(answer=answer, sources=sources, session_id=session_id)
 
@@ -172,6 +466,76 @@ def query_rag(request: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/query/stream")
+async def query_rag_stream(request: QueryRequest):
+    """
+    Streaming variant of /query as Server-Sent Events.
+    Emits {"delta": ...} frames while the answer is generated, then a final
+    {"done": true, "sources": [...], "session_id": ...} frame.
+    """
+    t0 = time.time()
+    try:
+        session_id = request.session_id or session_manager.create_session()
+        history = _resolve_history(request, session_id)
+        # An empty vendor means "no filter", everywhere below
+        vendor = request.vendor or None
+
+        question_embedding, cached, cache_generation = await _embed_and_lookup(
+            request.question, request.top_k, _is_cacheable(vendor, history)
+        )
+        context_chunks: List[str] = []
+        metadatas: List[Dict] = []
+        if cached is None:
+            context_chunks, metadatas = await run_in_threadpool(
+                hybrid_retrieve, request.question, request.top_k, question_embedding,
+                vendor,
+            )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        try:
+            if cached is not None:
+                answer, cached_sources = cached
+                sources = [SourceInfo(**s) for s in cached_sources]
+                yield _sse({"delta": answer})
+            elif not context_chunks:
+                answer = NO_RESULTS_ANSWER
+                sources = []
+                yield _sse({"delta": answer})
+            else:
+                # Token counting for the context budget is CPU-bound — keep it off the event loop
+                system, messages, cited = await run_in_threadpool(
+                    build_answer_prompt,
+                    question=request.question,
+                    context_chunks=context_chunks,
+                    metadatas=metadatas,
+                    conversation_history=history if history else None,
+                )
+                parts = []
+                async for delta in stream_answer(system, messages):
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+                answer = "".join(parts)
+                # Same list and order as the prompt's [Source i] labels
+                sources = _parse_sources(cited)
+                await _semantic_store(
+                    request.question, question_embedding, request.top_k, cache_generation, answer, sources
+                )
+
+            response_time = time.time() - t0
+            yield _sse({
+                "done": True,
+                "sources": [s.dict() for s in sources],
+                "session_id": session_id,
+            })
+            _record_turn(session_id, request.question, answer, response_time)
+        except Exception as e:
+            yield _sse({"error": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.post("/upload")
 async def upload_document(
     file: UploadFile = File(...),
@@ -180,77 +544,101 @@ async def upload_document(
     """Upload a PDF or HTML file and ingest it into ChromaDB."""
     try:
         filename = file.filename or "unknown"
-        ext = Path(filename).suffix.lower()
-        if ext not in (".pdf", ".html", ".htm"):
-            raise HTTPException(status_code=400, detail="Only PDF and HTML files are supported.")
+        ext = _check_extension(filename)
+        doc_vendor = _derive_vendor(vendor, filename)
 
-        # Auto-derive vendor from filename if not provided
-        doc_vendor = vendor.strip() if vendor.strip() else Path(filename).stem.replace("_", " ").replace("-", " ").title()
+        # Parsing, embedding and ChromaDB writes all block — keep them off the event loop
+        file_path, file_size, sha256, skipped = await _store_upload(file, filename, vendor, doc_vendor)
+        if skipped is not None:
+            return {**skipped, "file_size": file_size, "total_in_collection": get_collection().count()}
 
-        # Save to uploads folder
-        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-        file_path = UPLOAD_DIR / filename
+        documents, metadatas, ids = await run_in_threadpool(
+            _chunk_document, file_path, filename, ext, doc_vendor
+        )
+        await run_in_threadpool(_ingest_chunks, documents, metadatas, ids)
+        upload_registry.record(sha256, doc_vendor, filename, ids)
+        total = await run_in_threadpool(_refresh_after_ingest)
 
-        content = await file.read()
-        file_size = len(content)
-        with open(file_path, "wb") as f:
-            f.write(content)
+        return {
+            "status": "success",
+            "filename": filename,
+            "vendor": doc_vendor,
+            "chunks_added": len(documents),
+            "file_size": file_size,
+            "total_in_collection": total,
+        }
 
-        # Ingest into ChromaDB
-        col = get_collection()
-        emb = get_embedder()
-        chunks_added = 0
-
-        if ext == ".pdf":
-            pages = extract_pdf_text(file_path)
-            for page in pages:
-                chunks = chunk_text_pdf(page["text"])
-                for idx, chunk in enumerate(chunks):
-                    embedding = emb.encode(chunk).tolist()
-                    metadata = {
-                        "vendor": doc_vendor,
-                        "document": filename,
-                        "page": page["page_num"],
-                        "chunk": idx,
-                        "source_path": str(file_path),
-                    }
-                    doc_id = f"{doc_vendor}_{filename}_p{page['page_num']}_c{idx}"
-                    col.add(
-                        documents=[chunk],
-                        embeddings=[embedding],
-                        metadatas=[metadata],
-                        ids=[doc_id],
-                    )
-                    chunks_added += 1
-        else:
-            text = extract_html_text(file_path)
-            chunks = chunk_text_html(text)
-            for idx, chunk in enumerate(chunks):
-                embedding = emb.encode(chunk).tolist()
-                metadata = {
-                    "vendor": doc_vendor,
-                    "document": filename,
-                    "chunk": idx,
-                    "source_path": str(file_path),
-                }
-                doc_id = f"{doc_vendor}_{filename}_c{idx}"
-                col.add(
-                    documents=[chunk],
-                    embeddings=[embedding],
-                    metadatas=[metadata],
-                    ids=[doc_id],
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/upload-batch")
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    vendor: str = Form(default=""),
+):
+    """
+    Upload several PDF/HTML files in one request.
+    Chunks are accumulated across files and flushed to ChromaDB whenever
+    UPLOAD_FLUSH_CHUNKS are pending or UPLOAD_FLUSH_SECONDS have passed.
+    """
+    try:
+        filenames = [f.filename or "unknown" for f in files]
+        exts = [_check_extension(name) for name in filenames]
+
+        pending_docs: List[str] = []
+        pending_metas: List[Dict] = []
+        pending_ids: List[str] = []
+        last_flush = time.time()
+        results = []
+
+        # Once anything has been written to ChromaDB, the caches must be refreshed
+        # even if a later file fails, or they keep serving the old corpus
+        flushed = False
+        try:
+            for file, filename, ext in zip(files, filenames, exts):
+                doc_vendor = _derive_vendor(vendor, filename)
+                file_path, file_size, sha256, skipped = await _store_upload(
+                    file, filename, vendor, doc_vendor
                 )
-                chunks_added += 1
+                if skipped is not None:
+                    results.append({**skipped, "file_size": file_size})
+                    continue
 
-        reload_collection()
+                documents, metadatas, ids = await run_in_threadpool(
+                    _chunk_document, file_path, filename, ext, doc_vendor
+                )
+                upload_registry.record(sha256, doc_vendor, filename, ids)
+                pending_docs.extend(documents)
+                pending_metas.extend(metadatas)
+                pending_ids.extend(ids)
+                results.append({
+                    "filename": filename,
+                    "vendor": doc_vendor,
+                    "chunks_added": len(documents),
+                    "file_size": file_size,
+                })
+
+                if (len(pending_docs) >= UPLOAD_FLUSH_CHUNKS
+                        or time.time() - last_flush >= UPLOAD_FLUSH_SECONDS):
+                    flushed = True
+                    await run_in_threadpool(_ingest_chunks, pending_docs, pending_metas, pending_ids)
+                    pending_docs, pending_metas, pending_ids = [], [], []
+                    last_flush = time.time()
+
+            flushed = True
+            await run_in_threadpool(_ingest_chunks, pending_docs, pending_metas, pending_ids)
+        finally:
+            if flushed:
+                total = await run_in_threadpool(_refresh_after_ingest)
 
         return {
             "status": "success",
-            "filename": filename,
-            "vendor": doc_vendor,
-            "chunks_added": chunks_added,
-            "file_size": file_size,
-            "total_in_collection": col.count(),
+            "files": results,
+            "chunks_added": sum(r["chunks_added"] for r in results),
+            "total_in_collection": total,
         }
 
     except HTTPException:
@@ -262,60 +650,26 @@ async def upload_document(
 @app.get("/documents", response_model=DocumentListResponse)
 def list_documents():
     """List all indexed documents with counts."""
-    col = get_collection()
-    all_data = col.get(include=["metadatas"])
-    metadatas = all_data.get("metadatas", [])
-
-    # Group by vendor + document
-    doc_counts: Dict[str, Dict] = {}
-    for meta in metadatas:
-        vendor = meta.get("vendor", "Unknown")
-        doc_name = meta.get("document", "Unknown")
-        key = f"{vendor}/{doc_name}"
-        if key not in doc_counts:
-            doc_counts[key] = {
-                "vendor": vendor,
-                "document": doc_name,
-                "chunk_count": 0,
-                "pages": set(),
-            }
-        doc_counts[key]["chunk_count"] += 1
-        page = meta.get("page")
-        if page is not None:
-            doc_counts[key]["pages"].add(page)
-
-    # Convert sets to lists for JSON serialization
-    documents = []
-    for key, info in sorted(doc_counts.items()):
-        documents.append({
-            "vendor": info["vendor"],
-            "document": info["document"],
-            "chunk_count": info["chunk_count"],
-            "page_count": len(info["pages"]),
-        })
-
     return DocumentListResponse(
-        documents=documents,
-        total_chunks=len(metadatas),
+        documents=doc_index.list_documents(),
+        total_chunks=doc_index.total_chunks(),
     )
 
 
 @app.delete("/documents/{vendor}/{document_name}")
 def delete_document(vendor: str, document_name: str):
     """Remove a document from the index."""
-    col = get_collection()
-    all_data = col.get(include=["metadatas"])
-    ids_to_delete = []
-
-    for i, meta in enumerate(all_data.get("metadatas", [])):
-        if meta.get("vendor") == vendor and meta.get("document") == document_name:
-            ids_to_delete.append(all_data["ids"][i])
+    ids_to_delete = doc_index.get_ids(vendor, document_name)
 
     if not ids_to_delete:
         raise HTTPException(status_code=404, detail="Document not found in index.")
 
+    col = get_collection()
     col.delete(ids=ids_to_delete)
+    doc_index.remove(vendor, document_name)
+    upload_registry.forget_document(vendor, document_name)
     reload_collection()
+    semantic_cache.clear()
 
     return {
         "status": "deleted",
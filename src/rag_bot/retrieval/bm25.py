@@ -0,0 +1,245 @@
+"""
+Okapi BM25 over a term-major CSR postings matrix, scored by a numba-JIT kernel.
+
+Scores match rank_bm25.BM25Okapi (same idf flooring and k1/b defaults).
+"""
+
+import json
+import math
+import os
+import queue
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from numba import njit
+from scipy import sparse
+
+# Score buffers kept per index for reuse (one per concurrent retrieval thread)
+SCORE_POOL_SIZE = 8
+
+# Arrays written by BM25Index.save(), one .npy file each so load() can mmap them
+_ARRAY_FIELDS = ("indptr", "indices", "data", "doc_len", "idf")
+
+
+@njit(cache=True, nogil=True)
+def _score_kernel(q_term_ids, idf, indptr, indices, data, doc_len, avgdl, k1, b, out):
+    """Accumulate BM25 scores of every query term into out[doc]."""
+    out[:] = 0.0
+    for t in q_term_ids:
+        w = idf[t]
+        for p in range(indptr[t], indptr[t + 1]):
+            d = indices[p]
+            tf = data[p]
+            out[d] += w * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * doc_len[d] / avgdl))
+    return out
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first — O(N) partition + O(k log k) sort."""
+    scores = np.asarray(scores)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(scores, -k)[-k:]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class BM25Index:
+    """BM25 index of a tokenized corpus."""
+
+    def __init__(
+        self,
+        tokenized_docs: Iterable[List[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+
+        # Each document becomes an int32 token-id array as soon as it is read,
+        # so the corpus is never held as lists of Python strings
+        vocab = self.vocab
+        doc_tokens = [
+            np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int32, count=len(tokens))
+            for tokens in tokenized_docs
+        ]
+        n_docs = len(doc_tokens)
+        doc_len = np.fromiter((len(t) for t in doc_tokens), dtype=np.int64, count=n_docs)
+
+        # Unique (term, doc) pairs, term-major then doc-ascending, with their counts
+        terms = np.concatenate(doc_tokens).astype(np.int64) if n_docs else np.empty(0, dtype=np.int64)
+        docs = np.repeat(np.arange(n_docs, dtype=np.int64), doc_len)
+        pairs, tfs = np.unique(terms * max(n_docs, 1) + docs, return_counts=True)
+        term_ids = pairs // max(n_docs, 1)
+
+        # Postings sorted by term: indices/data[indptr[t]:indptr[t+1]] belong to term t
+        df = np.bincount(term_ids, minlength=len(self.vocab))
+        self.indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=self.indptr[1:])
+        self.indices = (pairs % max(n_docs, 1)).astype(np.int32)
+        self.data = tfs.astype(np.float32)
+        self.doc_len = doc_len.astype(np.float32)
+        self.avgdl = float(self.doc_len.mean()) if n_docs else 0.0
+
+        # idf as in BM25Okapi: negative values are floored to epsilon * mean idf
+        idf = np.log((n_docs - df + 0.5) / (df + 0.5))
+        floor = epsilon * (idf.sum() / len(idf)) if len(idf) else 0.0
+        idf[idf < 0] = floor
+        self.idf = idf.astype(np.float64)
+        self._term_weights: Optional[sparse.csr_matrix] = None
+        self._score_pool: queue.LifoQueue = queue.LifoQueue(maxsize=SCORE_POOL_SIZE)
+
+    def save(self, directory: Path):
+        """
+        Write the index to directory as .npy arrays plus small JSON files.
+        Every file is replaced atomically, never rewritten in place, so an
+        index already loaded (memory-mapped) from directory keeps reading
+        the old files.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        for field in _ARRAY_FIELDS:
+            save_npy_atomic(directory / f"{field}.npy", getattr(self, field))
+        # Terms in id order as JSON (a fixed-width str array would pad every
+        # term to the longest one); the vocab dict is rebuilt from this on load
+        terms = sorted(self.vocab, key=self.vocab.__getitem__)
+        _save_json_atomic(directory / "vocab.json", terms)
+        _save_json_atomic(directory / "params.json", {"k1": self.k1, "b": self.b, "avgdl": self.avgdl})
+
+    @classmethod
+    def load(cls, directory: Path) -> "BM25Index":
+        """
+        Load an index written by save(). Postings are memory-mapped read-only,
+        so pages are read from disk (or the page cache) only as queries touch them.
+        """
+        index = cls.__new__(cls)
+        with open(directory / "params.json", encoding="utf-8") as f:
+            params = json.load(f)
+        index.k1, index.b, index.avgdl = params["k1"], params["b"], params["avgdl"]
+        for field in _ARRAY_FIELDS:
+            setattr(index, field, np.load(directory / f"{field}.npy", mmap_mode="r"))
+        with open(directory / "vocab.json", encoding="utf-8") as f:
+            index.vocab = {term: i for i, term in enumerate(json.load(f))}
+        index._term_weights = None
+        index._score_pool = queue.LifoQueue(maxsize=SCORE_POOL_SIZE)
+        return index
+
+    @property
+    def term_weights(self) -> sparse.csr_matrix:
+        """
+        (vocab, corpus) sparse matrix of per-posting BM25 term-frequency
+        factors tf*(k1+1) / (tf + k1*(1 - b + b*dl/avgdl)), built on first use.
+        """
+        if self._term_weights is None:
+            tf = self.data
+            dl = self.doc_len[self.indices]
+            avgdl = self.avgdl or 1.0
+            weights = tf * (self.k1 + 1.0) / (tf + self.k1 * (1.0 - self.b + self.b * dl / avgdl))
+            self._term_weights = sparse.csr_matrix(
+                (weights.astype(np.float64), self.indices, self.indptr),
+                shape=(len(self.vocab), self.corpus_size),
+            )
+        return self._term_weights
+
+    @property
+    def corpus_size(self) -> int:
+        return len(self.doc_len)
+
+    def term_ids(self, tokens: List[str]) -> np.ndarray:
+        """Map query tokens to term ids, dropping out-of-vocabulary tokens."""
+        ids = [self.vocab[t] for t in tokens if t in self.vocab]
+        return np.asarray(ids, dtype=np.int64)
+
+    def get_scores(self, tokens: List[str], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """BM25 score of every document for a tokenized query."""
+        if out is None:
+            out = np.empty(self.corpus_size, dtype=np.float64)
+        if self.corpus_size == 0 or math.isclose(self.avgdl, 0.0):
+            out[:] = 0.0
+            return out
+        return _score_kernel(
+            self.term_ids(tokens), self.idf, self.indptr, self.indices, self.data,
+            self.doc_len, self.avgdl, self.k1, self.b, out,
+        )
+
+    @contextmanager
+    def score_buffer(self):
+        """
+        Borrow a corpus-sized float64 buffer for get_scores(out=...).
+        The buffer goes back to the pool on exit, so results read from it
+        must be copied out inside the with block.
+        """
+        try:
+            buf = self._score_pool.get_nowait()
+        except queue.Empty:
+            buf = np.empty(self.corpus_size, dtype=np.float64)
+        try:
+            yield buf
+        finally:
+            try:
+                self._score_pool.put_nowait(buf)
+            except queue.Full:
+                pass
+
+    def restrict(self, doc_rows: np.ndarray) -> "BM25Subset":
+        """Scorer over a subset of documents, keeping corpus-wide idf and avgdl."""
+        return BM25Subset(self, doc_rows)
+
+    def get_scores_batch(self, tokenized_queries: List[List[str]]) -> np.ndarray:
+        """
+        BM25 scores for several queries at once, as a (queries, corpus) array.
+        Computed as one sparse product of idf-weighted query term counts with
+        the term-weight matrix.
+        """
+        rows, cols = [], []
+        for q, tokens in enumerate(tokenized_queries):
+            term_ids = self.term_ids(tokens)
+            rows.extend([q] * len(term_ids))
+            cols.extend(term_ids.tolist())
+        # Duplicate (row, term) entries are summed, matching repeated query terms
+        query_matrix = sparse.csr_matrix(
+            (self.idf[cols], (rows, cols)),
+            shape=(len(tokenized_queries), len(self.vocab)),
+        )
+        return (query_matrix @ self.term_weights).toarray()
+
+
+def save_npy_atomic(path: Path, array: np.ndarray):
+    """
+    np.save to a temporary file, then rename it over path. Truncating a file
+    that is memory-mapped elsewhere would make readers of the mapping SIGBUS;
+    a rename leaves existing mappings on the old inode.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _save_json_atomic(path: Path, obj):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+class BM25Subset:
+    """
+    BM25 restricted to a fixed set of document rows (e.g. one vendor).
+    Scoring only touches the query terms' postings within the subset.
+    """
+
+    def __init__(self, index: BM25Index, doc_rows: np.ndarray):
+        self.index = index
+        self.rows = np.asarray(doc_rows, dtype=np.int64)
+        self.weights = index.term_weights[:, self.rows].tocsr()
+
+    def get_scores(self, tokens: List[str]) -> np.ndarray:
+        """BM25 score of every document in the subset, aligned with self.rows."""
+        term_ids = self.index.term_ids(tokens)
+        if len(term_ids) == 0 or len(self.rows) == 0:
+            return np.zeros(len(self.rows), dtype=np.float64)
+        return np.asarray(self.index.idf[term_ids] @ self.weights[term_ids]).ravel()
@@ -0,0 +1,72 @@
+"""
+Similarity cache for hybrid retrieval results.
+
+Keeps the most recent (query embedding -> result) pairs in a fixed-size ring
+buffer; a new query whose embedding is close enough to a cached one reuses
+that result instead of running BM25 and vector search again.
+"""
+
+import threading
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from rag_bot.config import RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_THRESHOLD
+
+
+class RetrievalResultCache:
+    """Ring buffer of normalized query embeddings scanned with one matrix-vector product."""
+
+    def __init__(
+        self,
+        max_entries: int = RETRIEVAL_CACHE_SIZE,
+        threshold: float = RETRIEVAL_CACHE_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._vectors: Optional[np.ndarray] = None
+            # Entries only match queries with the same key (top_k, filters, ...);
+            # keys are interned to ints so the match is one vectorized compare
+            self._key_codes: Dict[Hashable, int] = {}
+            self._keys = np.full(self.max_entries, -1, dtype=np.int64)
+            self._results: List[Any] = [None] * self.max_entries
+            self._size = 0
+            self._next = 0
+
+    def get(self, query_embedding, key: Hashable) -> Optional[Any]:
+        """Return the cached result of the most similar query with the same key, if above threshold."""
+        query = _normalize(query_embedding)
+        with self._lock:
+            code = self._key_codes.get(key)
+            if self._size == 0 or code is None:
+                return None
+            sims = self._vectors[:self._size] @ query
+            sims[self._keys[:self._size] != code] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            return self._results[best]
+
+    def put(self, query_embedding, key: Hashable, result: Any):
+        query = _normalize(query_embedding)
+        with self._lock:
+            if self._vectors is None:
+                # float32 on purpose: numpy has no BLAS path for float16, so an
+                # fp16 matrix-vector scan is much slower on CPU than fp32
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+            slot = self._next
+            self._vectors[slot] = query
+            self._keys[slot] = self._key_codes.setdefault(key, len(self._key_codes))
+            self._results[slot] = result
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
@@ -2,84 +2,294 @@
 Hybrid retriever: BM25 keyword search + ChromaDB vector search, merged with RRF.
 """
 
+import hashlib
+import json
 import time
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Tuple, Optional
 
 import chromadb
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
-from rank_bm25 import BM25Okapi
 from pathlib import Path
 
-from rag_bot.config import CHROMA_DB_DIR, EMBED_MODEL_NAME, COLLECTION_NAME
+from rag_bot.config import (
+    CHROMA_DB_DIR, BM25_INDEX_DIR, EMBED_MODEL_NAME, QUERY_MAX_SEQ_LENGTH, COLLECTION_NAME,
+    ADAPTIVE_HYBRID, ADAPTIVE_HYBRID_MAX_DISTANCE, ADAPTIVE_HYBRID_MIN_MARGIN,
+)
+from rag_bot.retrieval.bm25 import BM25Index, save_npy_atomic, top_k_indices
+from rag_bot.retrieval.result_cache import RetrievalResultCache
 
 
 # Module-level singletons
-embedder = SentenceTransformer(EMBED_MODEL_NAME)
+_embed_device = "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _load_embedder(max_seq_length: Optional[int] = None) -> SentenceTransformer:
+    model = SentenceTransformer(EMBED_MODEL_NAME, device=_embed_device)
+    if max_seq_length is not None:
+        model.max_seq_length = max_seq_length
+    if _embed_device == "cuda":
+        model.half()
+    return model
+
+
+# Query embedder: truncated to QUERY_MAX_SEQ_LENGTH tokens, warmed up at import
+# so the first request doesn't pay for lazy CUDA/tokenizer initialisation
+embedder = _load_embedder(QUERY_MAX_SEQ_LENGTH)
+embedder.encode(["warmup"], convert_to_numpy=True)
+# Document embedder (full sequence length), loaded on first ingest
+_document_embedder: Optional[SentenceTransformer] = None
+_document_embedder_lock = threading.Lock()
 chroma_client = chromadb.PersistentClient(path=str(CHROMA_DB_DIR))
 collection = chroma_client.get_or_create_collection(COLLECTION_NAME)
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+# BM25 index cache, keyed by (reload generation, collection count)
+_BM25_CACHE = {"version": None, "payload": None}
+_bm25_lock = threading.Lock()
+_corpus_generation = 0
+
+# Results of recent hybrid_retrieve calls, reused for near-duplicate queries
+_result_cache = RetrievalResultCache()
+
+
+_TOKEN_RE = re.compile(r'\w+')
 
 
 def _tokenize(text: str) -> List[str]:
     """Simple whitespace + lowercase tokenizer for BM25."""
-    return re.findall(r'\w+', text.lower())
+    # Lower-casing the whole text first is faster than lower-casing each match
+    return _TOKEN_RE.findall(text.lower())
+
+
+# Written last by _persist_bm25 and removed whenever the corpus changes
+_BM25_SENTINEL = BM25_INDEX_DIR / "corpus.json"
+
+
+def _corpus_digest(ids: List[str]) -> str:
+    return hashlib.blake2b("\n".join(ids).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _load_persisted_bm25(ids: List[str]):
+    """
+    Return (index, vendors) from BM25_INDEX_DIR if it was built from exactly
+    these ids. Ids alone don't cover in-place edits (upserts over the same ids,
+    vendor updates), so reload_collection() also drops the sentinel.
+    """
+    try:
+        with open(_BM25_SENTINEL, encoding="utf-8") as f:
+            sentinel = json.load(f)
+        if sentinel["count"] != len(ids) or sentinel["digest"] != _corpus_digest(ids):
+            return None
+        return BM25Index.load(BM25_INDEX_DIR), np.load(BM25_INDEX_DIR / "vendors.npy")
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _persist_bm25(bm25: BM25Index, ids: List[str], vendors: np.ndarray):
+    """Save the index under BM25_INDEX_DIR; the corpus sentinel is written last."""
+    try:
+        # Drop the sentinel first so a half-written index is never picked up
+        _BM25_SENTINEL.unlink(missing_ok=True)
+        bm25.save(BM25_INDEX_DIR)
+        save_npy_atomic(BM25_INDEX_DIR / "vendors.npy", vendors)
+        tmp_path = _BM25_SENTINEL.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"count": len(ids), "digest": _corpus_digest(ids)}, f)
+        tmp_path.replace(_BM25_SENTINEL)
+    except OSError as e:
+        print(f"[BM25] Could not persist index: {e}")
 
 
 def _build_bm25_index():
-    """Build a BM25 index over all documents in ChromaDB."""
-    all_data = collection.get(include=["documents", "metadatas"])
-    docs = all_data.get("documents", [])
-    metas = all_data.get("metadatas", [])
-    ids = all_data.get("ids", [])
-    if not docs:
-        return None, [], [], []
-    tokenized = [_tokenize(d) for d in docs]
-    bm25 = BM25Okapi(tokenized)
-    return bm25, docs, metas, ids
-
-
-def retrieve_vector(query: str, top_k: int = 10) -> List[Dict]:
-    """Vector search via ChromaDB embeddings."""
-    query_embedding = embedder.encode(query).tolist()
+    """
+    Return (index, ids, vendors, subsets) for all documents in ChromaDB.
+    The index is cached and only rebuilt when the corpus version changes
+    (reload_collection() was called or the collection count moved). A rebuild
+    first tries the copy persisted under BM25_INDEX_DIR, which is reused
+    (memory-mapped) when it was built from the same chunk ids.
+    """
+    with _bm25_lock:
+        version = (_corpus_generation, collection.count())
+        if _BM25_CACHE["version"] == version:
+            return _BM25_CACHE["payload"]
+
+        ids = collection.get(include=[]).get("ids", [])
+        persisted = _load_persisted_bm25(ids) if ids else None
+        if not ids:
+            payload = (None, [], np.empty(0, dtype=np.str_), {})
+        elif persisted is not None:
+            bm25, vendors = persisted
+            print(f"[BM25] Loaded persisted index ({len(ids)} chunks)")
+            payload = (bm25, ids, vendors, {})
+        else:
+            all_data = collection.get(include=["documents", "metadatas"])
+            ids = all_data.get("ids", [])
+            vendors = np.asarray(
+                [(meta or {}).get("vendor", "") for meta in all_data.get("metadatas", [])],
+                dtype=np.str_,
+            )
+            # Documents are tokenized lazily, one at a time, while the index is built
+            bm25 = BM25Index(_tokenize(d) for d in all_data.get("documents", []))
+            _persist_bm25(bm25, ids, vendors)
+            payload = (bm25, ids, vendors, {})
+
+        # Last element: per-vendor BM25Subset scorers, filled on demand
+        _BM25_CACHE["version"] = version
+        _BM25_CACHE["payload"] = payload
+        return payload
+
+
+def _vendor_subset(bm25: BM25Index, vendors: np.ndarray, subsets: Dict, vendor: str):
+    """BM25 scorer restricted to one vendor's documents (cached per index build)."""
+    subset = subsets.get(vendor)
+    if subset is None:
+        subset = subsets[vendor] = bm25.restrict(np.flatnonzero(vendors == vendor))
+    return subset
+
+
+def _fetch_payload(ids: List[str]) -> Dict[str, Tuple[str, Dict]]:
+    """Fetch {id: (document, metadata)} from ChromaDB for the given chunk ids."""
+    if not ids:
+        return {}
+    payload = collection.get(ids=list(ids), include=["documents", "metadatas"])
+    return {
+        doc_id: (doc, meta)
+        for doc_id, doc, meta in zip(payload["ids"], payload["documents"], payload["metadatas"])
+    }
+
+
+@lru_cache(maxsize=1024)
+def _encode_query(query: str) -> np.ndarray:
+    embedding = embedder.encode(
+        query, convert_to_numpy=True, normalize_embeddings=True
+    ).astype(np.float32)
+    # Cached arrays are shared between callers, so make them read-only
+    embedding.flags.writeable = False
+    return embedding
+
+
+def encode_query(query: str) -> np.ndarray:
+    """
+    Embed a query string for vector search (memoized per query string).
+    Returns a unit-length, read-only float32 array; convert with
+    as_chroma_embedding only when handing it to ChromaDB.
+    """
+    return _encode_query(query)
+
+
+def as_chroma_embedding(embedding) -> List[float]:
+    """Convert an embedding to the plain float list ChromaDB's client expects."""
+    return np.asarray(embedding, dtype=np.float32).tolist()
+
+
+def _attach_payload(
+    hits: List[Dict],
+    by_id: Optional[Dict[str, Tuple[str, Dict]]] = None,
+) -> List[Dict]:
+    """Add document/metadata to id-only hits (fetched from ChromaDB unless by_id is given)."""
+    if by_id is None:
+        by_id = _fetch_payload([hit["id"] for hit in hits])
+    return [
+        {**hit, "document": by_id[hit["id"]][0], "metadata": by_id[hit["id"]][1]}
+        for hit in hits
+        if hit["id"] in by_id
+    ]
+
+
+def _vector_ids(
+    query_embedding: np.ndarray,
+    top_k: int,
+    vendor: Optional[str] = None,
+) -> List[Dict]:
+    """Vector search returning id-only hits: {id, distance, source}."""
     results = collection.query(
-        query_embeddings=[query_embedding],
+        query_embeddings=[as_chroma_embedding(query_embedding)],
         n_results=top_k,
-        include=["documents", "metadatas", "distances"]
+        where={"vendor": vendor} if vendor else None,
+        include=["distances"]
     )
-    hits = []
-    for i in range(len(results["ids"][0])):
-        hits.append({
-            "id": results["ids"][0][i],
-            "document": results["documents"][0][i],
-            "metadata": results["metadatas"][0][i],
-            "distance": results["distances"][0][i],
-            "source": "vector"
-        })
-    return hits
-
-
-def retrieve_bm25(query: str, top_k: int = 10) -> List[Dict]:
-    """BM25 keyword search over all documents."""
-    bm25, docs, metas, ids = _build_bm25_index()
+    return [
+        {"id": doc_id, "distance": distance, "source": "vector"}
+        for doc_id, distance in zip(results["ids"][0], results["distances"][0])
+    ]
+
+
+def retrieve_vector(
+    query: str,
+    top_k: int = 10,
+    query_embedding: Optional[np.ndarray] = None,
+    vendor: Optional[str] = None,
+) -> List[Dict]:
+    """Vector search via ChromaDB embeddings, optionally restricted to one vendor."""
+    if query_embedding is None:
+        query_embedding = encode_query(query)
+    return _attach_payload(_vector_ids(query_embedding, top_k, vendor))
+
+
+def _bm25_ids(query: str, top_k: int, vendor: Optional[str] = None) -> List[Dict]:
+    """BM25 search returning id-only hits: {id, bm25_score, source}."""
+    bm25, ids, vendors, subsets = _build_bm25_index()
     if bm25 is None:
         return []
     tokenized_query = _tokenize(query)
-    scores = bm25.get_scores(tokenized_query)
+    if vendor is not None:
+        subset = _vendor_subset(bm25, vendors, subsets, vendor)
+        return _bm25_hits(subset.get_scores(tokenized_query), top_k, ids, rows=subset.rows)
+
+    # Score into a pooled buffer instead of allocating a corpus-sized array per query
+    with bm25.score_buffer() as scores:
+        bm25.get_scores(tokenized_query, out=scores)
+        return _bm25_hits(scores, top_k, ids)
+
+
+def _bm25_hits(
+    scores: np.ndarray,
+    top_k: int,
+    ids: List[str],
+    rows: Optional[np.ndarray] = None,
+) -> List[Dict]:
+    """
+    Id-only hits for the top-k matching documents, best first;
+    rows maps score positions to corpus rows for subset scores.
+    """
+    # Top-k by partition, then keep only documents that matched at all
+    ranked_indices = top_k_indices(scores, top_k)
+    ranked_indices = ranked_indices[scores[ranked_indices] > 0]
+    doc_indices = ranked_indices if rows is None else rows[ranked_indices]
+    return [
+        {"id": ids[row], "bm25_score": float(scores[idx]), "source": "bm25"}
+        for idx, row in zip(ranked_indices, doc_indices)
+    ]
+
 
-    # Get top-k indices
-    ranked_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
+def retrieve_bm25(query: str, top_k: int = 10, vendor: Optional[str] = None) -> List[Dict]:
+    """
+    BM25 keyword search over all documents, or only one vendor's documents
+    (scored over that vendor's subset, with corpus-wide idf).
+    """
+    return _attach_payload(_bm25_ids(query, top_k, vendor))
+
+
+def retrieve_bm25_batch(queries: List[str], top_k: int = 10) -> List[List[Dict]]:
+    """
+    BM25 keyword search for many queries at once (evaluation sweeps, analytics
+    replays). Same hits per query as retrieve_bm25, scored in one sparse product.
+    """
+    bm25, ids, _, _ = _build_bm25_index()
+    if bm25 is None:
+        return [[] for _ in queries]
+    all_scores = bm25.get_scores_batch([_tokenize(q) for q in queries])
 
-    hits = []
-    for idx in ranked_indices:
-        if scores[idx] > 0:
-            hits.append({
-                "id": ids[idx],
-                "document": docs[idx],
-                "metadata": metas[idx],
-                "bm25_score": float(scores[idx]),
-                "source": "bm25"
-            })
-    return hits
+    all_hits = [_bm25_hits(scores, top_k, ids) for scores in all_scores]
+    # One payload fetch for the hits of every query
+    by_id = _fetch_payload(list({hit["id"] for hits in all_hits for hit in hits}))
+    return [_attach_payload(hits, by_id) for hits in all_hits]
 
 
 def reciprocal_rank_fusion(
@@ -89,55 +299,95 @@ def reciprocal_rank_fusion(
     top_k: int = 5
 ) -> List[Dict]:
     """Merge results using Reciprocal Rank Fusion (RRF)."""
-    scores = {}
-    doc_map = {}
-
-    # Score vector results
-    for rank, hit in enumerate(vector_hits):
-        doc_id = hit["id"]
-        scores[doc_id] = scores.get(doc_id, 0) + 1.0 / (k + rank + 1)
-        doc_map[doc_id] = hit
-
-    # Score BM25 results
-    for rank, hit in enumerate(bm25_hits):
-        doc_id = hit["id"]
-        scores[doc_id] = scores.get(doc_id, 0) + 1.0 / (k + rank + 1)
-        if doc_id not in doc_map:
-            doc_map[doc_id] = hit
-
-    # Sort by RRF score
-    sorted_ids = sorted(scores.keys(), key=lambda x: scores[x], reverse=True)[:top_k]
+    hits = vector_hits + bm25_hits
+    if not hits:
+        return []
 
-    return [doc_map[doc_id] for doc_id in sorted_ids]
+    # Each hit contributes 1 / (k + rank + 1); fuse contributions per document id
+    ranks = np.concatenate([np.arange(len(vector_hits)), np.arange(len(bm25_hits))])
+    contributions = 1.0 / (k + ranks + 1)
+    ids = np.asarray([hit["id"] for hit in hits])
+    _, first_seen, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    scores = np.zeros(len(first_seen))
+    np.add.at(scores, inverse, contributions)
+
+    # Sort by RRF score; ties keep first-seen order (vector hits before BM25),
+    # and the first occurrence supplies the hit payload
+    order = np.lexsort((first_seen, -scores))[:top_k]
+    return [hits[first_seen[i]] for i in order]
+
+
+def _vector_is_confident(vector_hits: List[Dict]) -> bool:
+    """True when the top vector hit is close to the query and well ahead of the runner-up."""
+    if len(vector_hits) < 2:
+        return False
+    d0, d1 = vector_hits[0]["distance"], vector_hits[1]["distance"]
+    return (
+        d0 < ADAPTIVE_HYBRID_MAX_DISTANCE
+        and (d1 - d0) / max(d0, 1e-6) > ADAPTIVE_HYBRID_MIN_MARGIN
+    )
 
 
-def hybrid_retrieve(query: str, top_k: int = 5) -> Tuple[List[str], List[Dict]]:
+def hybrid_retrieve(
+    query: str,
+    top_k: int = 5,
+    query_embedding: Optional[np.ndarray] = None,
+    vendor: Optional[str] = None,
+) -> Tuple[List[str], List[Dict]]:
     """
     Hybrid retrieval: combines vector and BM25 search with RRF.
+    Pass query_embedding to reuse an embedding the caller already computed,
+    and vendor to search only that vendor's documents.
     Returns (context_chunks, metadatas).
     """
     t0 = time.time()
 
-    vector_hits = retrieve_vector(query, top_k=top_k * 2)
-    bm25_hits = retrieve_bm25(query, top_k=top_k * 2)
-    merged = reciprocal_rank_fusion(vector_hits, bm25_hits, top_k=top_k)
+    if query_embedding is None:
+        query_embedding = encode_query(query)
+
+    vendor = vendor or None  # "" means no filter, as in the Chroma where clause
+    cache_key = (top_k, vendor)
+    cached = _result_cache.get(query_embedding, cache_key)
+    if cached is not None:
+        print(f"[Timing] Hybrid retrieval: {time.time() - t0:.3f}s (cache hit)")
+        return list(cached[0]), list(cached[1])
+
+    # Both searches rank on ids only; documents/metadata are fetched once, for
+    # the merged winners, instead of for all 2 * top_k candidates of each search
+    # Vector (Chroma) and BM25 (CPU) searches are independent — run them together
+    vector_future = _executor.submit(_vector_ids, query_embedding, top_k * 2, vendor)
+    bm25_future = _executor.submit(_bm25_ids, query, top_k * 2, vendor)
+    vector_hits = vector_future.result()
+    if ADAPTIVE_HYBRID and _vector_is_confident(vector_hits):
+        # Clear vector winner: don't wait for BM25 (cancelled if not yet started)
+        bm25_future.cancel()
+        bm25_hits = []
+        merged = vector_hits[:top_k]
+    else:
+        bm25_hits = bm25_future.result()
+        merged = reciprocal_rank_fusion(vector_hits, bm25_hits, top_k=top_k)
+    merged = _attach_payload(merged)
 
     print(f"[Timing] Hybrid retrieval: {time.time() - t0:.3f}s "
           f"(vector={len(vector_hits)}, bm25={len(bm25_hits)}, merged={len(merged)})")
 
-    if not merged:
-        return [], []
-
     context_chunks = [hit["document"] for hit in merged]
     metadatas = [hit["metadata"] for hit in merged]
-    return context_chunks, metadatas
+    _result_cache.put(query_embedding, cache_key, (context_chunks, metadatas))
+    return list(context_chunks), list(metadatas)
 
 
-def retrieve_by_vendor(query: str, vendor: str, top_k: int = 5) -> Tuple[List[str], List[Dict]]:
+def retrieve_by_vendor(
+    query: str,
+    vendor: str,
+    top_k: int = 5,
+    query_embedding: Optional[np.ndarray] = None,
+) -> Tuple[List[str], List[Dict]]:
     """Retrieve documents filtered to a specific vendor."""
-    query_embedding = embedder.encode(query).tolist()
+    if query_embedding is None:
+        query_embedding = encode_query(query)
     results = collection.query(
-        query_embeddings=[query_embedding],
+        query_embeddings=[as_chroma_embedding(query_embedding)],
         n_results=top_k,
         where={"vendor": vendor},
         include=["documents", "metadatas", "distances"]
@@ -153,12 +403,24 @@ def get_collection():
 
 
 def get_embedder():
-    """Return the embedding model for external use."""
-    return embedder
+    """Return the document embedding model (full sequence length) for external use."""
+    global _document_embedder
+    with _document_embedder_lock:
+        if _document_embedder is None:
+            _document_embedder = _load_embedder()
+        return _document_embedder
 
 
 def reload_collection():
     """Reload the ChromaDB collection (after adding new docs)."""
-    global collection
+    global collection, _corpus_generation
     collection = chroma_client.get_or_create_collection(COLLECTION_NAME)
+    with _bm25_lock:
+        _corpus_generation += 1
+        # The corpus may have changed in place, so the persisted index can't be trusted
+        try:
+            _BM25_SENTINEL.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"[BM25] Could not invalidate persisted index: {e}")
+    _result_cache.clear()
     return collection
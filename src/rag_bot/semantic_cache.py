@@ -0,0 +1,124 @@
+"""
+Semantic answer cache backed by a dedicated ChromaDB collection.
+
+A question whose embedding is within SEMANTIC_CACHE_THRESHOLD cosine similarity
+of a previously answered question gets the stored answer back, skipping both
+retrieval and generation.
+"""
+
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from rag_bot.config import (
+    SEMANTIC_CACHE_COLLECTION, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES,
+)
+from rag_bot.retrieval.retriever import as_chroma_embedding, chroma_client
+
+# Share of max_entries evicted at once when the cache overflows, so the full
+# id listing and sort runs once per batch rather than on every store
+EVICT_FRACTION = 0.1
+
+
+class SemanticCache:
+    """Stores (question embedding -> answer, sources) with FIFO eviction."""
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # Guards the collection, which clear() drops and recreates
+        self._lock = threading.Lock()
+        # Bumped by clear(); answers computed against an older corpus are not stored
+        self._generation = 0
+        self._collection = self._open()
+
+    @property
+    def generation(self) -> int:
+        """Current corpus generation; pass it back to store()."""
+        return self._generation
+
+    def _open(self):
+        return chroma_client.get_or_create_collection(
+            SEMANTIC_CACHE_COLLECTION,
+            metadata={"hnsw:space": "cosine"},
+        )
+
+    def lookup(self, question_embedding: Sequence[float], top_k: int) -> Optional[Tuple[str, List[Dict]]]:
+        """
+        Return (answer, sources) for the closest cached question answered with
+        the same top_k, if close enough.
+        """
+        with self._lock:
+            if self._collection.count() == 0:
+                return None
+            results = self._collection.query(
+                query_embeddings=[as_chroma_embedding(question_embedding)],
+                n_results=1,
+                where={"top_k": top_k},
+                include=["documents", "metadatas", "distances"],
+            )
+        if not results["ids"][0]:
+            return None
+        similarity = 1.0 - results["distances"][0][0]
+        if similarity < self.threshold:
+            return None
+        meta = results["metadatas"][0][0]
+        return results["documents"][0][0], json.loads(meta.get("sources", "[]"))
+
+    def store(
+        self,
+        question: str,
+        question_embedding: Sequence[float],
+        answer: str,
+        sources: List[Dict],
+        top_k: int,
+        generation: int,
+    ):
+        """
+        Cache an answer for a question embedding. generation is the value of
+        self.generation read before retrieval; if clear() ran since, the answer
+        came from the old corpus and is dropped.
+        """
+        timestamp = time.time()
+        # Zero-padded nanosecond ids sort in insertion order, which drives eviction
+        entry_id = f"{time.time_ns():020d}"
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._collection.add(
+                ids=[entry_id],
+                embeddings=[as_chroma_embedding(question_embedding)],
+                documents=[answer],
+                metadatas=[{
+                    "question": question,
+                    "sources": json.dumps(sources),
+                    "top_k": top_k,
+                    "timestamp": timestamp,
+                }],
+            )
+            self._evict()
+
+    def clear(self):
+        """Drop every cached answer (e.g. after the document index changes)."""
+        with self._lock:
+            self._generation += 1
+            chroma_client.delete_collection(SEMANTIC_CACHE_COLLECTION)
+            self._collection = self._open()
+
+    def _evict(self):
+        """Once over max_entries, drop the oldest entries down to (1 - EVICT_FRACTION) of it."""
+        count = self._collection.count()
+        if count <= self.max_entries:
+            return
+        keep = int(self.max_entries * (1 - EVICT_FRACTION))
+        ids = sorted(self._collection.get(include=[])["ids"])
+        self._collection.delete(ids=ids[:count - keep])
+
+
+# Global singleton
+semantic_cache = SemanticCache()
@@ -2,92 +2,115 @@
 In-memory session manager for conversation history and analytics.
 """
 
+import threading
 import time
 import uuid
-from typing import Dict, List, Optional
-from collections import defaultdict
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import Counter, deque
+
+# Per-session history length and analytics buffer sizes
+MAX_HISTORY_MESSAGES = 20
+RECENT_QUERIES_MAX = 100
+
+# Topic counter bound: once it holds more than TOPIC_COUNTS_MAX words, only
+# the TOPIC_COUNTS_KEEP most frequent are kept
+TOPIC_COUNTS_MAX = 2048
+TOPIC_COUNTS_KEEP = 1024
 
 
 class SessionManager:
     """Manages conversation sessions and query analytics."""
 
     def __init__(self):
-        # session_id -> list of messages [{role, content}]
-        self._sessions: Dict[str, List[Dict]] = {}
+        # session_id -> last MAX_HISTORY_MESSAGES messages [{role, content}]
+        self._sessions: Dict[str, Deque[Dict]] = {}
         # session_id -> creation timestamp
         self._session_created: Dict[str, float] = {}
+        # session_id -> lock guarding that session's history
+        self._session_locks: Dict[str, threading.Lock] = {}
+        # Guards the session maps above and the analytics below; requests and
+        # background tasks call in from several threads
+        self._lock = threading.Lock()
         # Analytics tracking
         self._query_count: int = 0
-        self._recent_queries: List[Dict] = []
-        self._topic_counts: Dict[str, int] = defaultdict(int)
-        self._response_times: List[float] = []
+        self._recent_queries: Deque[Dict] = deque(maxlen=RECENT_QUERIES_MAX)
+        self._topic_counts: Counter = Counter()
+        # Running total for the average response time
+        self._rt_sum: float = 0.0
+        self._rt_count: int = 0
+
+    def _session(self, session_id: str) -> Tuple[Deque[Dict], threading.Lock]:
+        """Return (history, lock) for a session, creating it if needed."""
+        with self._lock:
+            if session_id not in self._sessions:
+                self._sessions[session_id] = deque(maxlen=MAX_HISTORY_MESSAGES)
+                self._session_created[session_id] = time.time()
+                self._session_locks[session_id] = threading.Lock()
+            return self._sessions[session_id], self._session_locks[session_id]
 
     def create_session(self) -> str:
         """Create a new session and return its ID."""
         session_id = str(uuid.uuid4())
-        self._sessions[session_id] = []
-        self._session_created[session_id] = time.time()
+        self._session(session_id)
         return session_id
 
     def get_history(self, session_id: str) -> List[Dict]:
-        """Get conversation history for a session."""
-        if session_id not in self._sessions:
-            self._sessions[session_id] = []
-            self._session_created[session_id] = time.time()
-        return self._sessions[session_id]
+        """Get a snapshot of the conversation history for a session."""
+        history, lock = self._session(session_id)
+        with lock:
+            return list(history)
 
     def add_message(self, session_id: str, role: str, content: str):
         """Add a message to session history."""
-        if session_id not in self._sessions:
-            self._sessions[session_id] = []
-            self._session_created[session_id] = time.time()
-        self._sessions[session_id].append({"role": role, "content": content})
-        # Keep history manageable (last 20 messages)
-        if len(self._sessions[session_id]) > 20:
-            self._sessions[session_id] = self._sessions[session_id][-20:]
+        history, lock = self._session(session_id)
+        # The deque keeps history manageable (last MAX_HISTORY_MESSAGES messages)
+        with lock:
+            history.append({"role": role, "content": content})
 
     def delete_session(self, session_id: str):
         """Delete a session."""
-        self._sessions.pop(session_id, None)
-        self._session_created.pop(session_id, None)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._session_created.pop(session_id, None)
+            self._session_locks.pop(session_id, None)
 
     def track_query(self, question: str, response_time: float):
         """Track a query for analytics."""
+        with self._lock:
+            self._track_query(question, response_time)
+
+    def _track_query(self, question: str, response_time: float):
         self._query_count += 1
-        self._response_times.append(response_time)
+        self._rt_sum += response_time
+        self._rt_count += 1
         self._recent_queries.append({
             "question": question,
             "timestamp": time.time(),
             "response_time": response_time,
         })
-        # Keep only last 100 queries
-        if len(self._recent_queries) > 100:
-            self._recent_queries = self._recent_queries[-100:]
         # Track topics (simple keyword extraction)
-        for word in question.lower().split():
-            if len(word) > 3 and word.isalpha():
-                self._topic_counts[word] += 1
+        self._topic_counts.update(
+            word for word in question.lower().split()
+            if len(word) > 3 and word.isalpha()
+        )
+        if len(self._topic_counts) > TOPIC_COUNTS_MAX:
+            self._topic_counts = Counter(dict(self._topic_counts.most_common(TOPIC_COUNTS_KEEP)))
 
     def get_analytics(self) -> Dict:
         """Return analytics data."""
-        avg_time = (
-            sum(self._response_times) / len(self._response_times)
-            if self._response_times
-            else 0
-        )
-        # Get top topics
-        sorted_topics = sorted(
-            self._topic_counts.items(), key=lambda x: x[1], reverse=True
-        )[:20]
-        return {
-            "total_queries": self._query_count,
-            "active_sessions": len(self._sessions),
-            "avg_response_time": round(avg_time, 3),
-            "popular_topics": [
-                {"topic": t, "count": c} for t, c in sorted_topics
-            ],
-            "recent_queries": self._recent_queries[-10:],
-        }
+        with self._lock:
+            avg_time = self._rt_sum / self._rt_count if self._rt_count else 0
+            # Get top topics
+            sorted_topics = self._topic_counts.most_common(20)
+            return {
+                "total_queries": self._query_count,
+                "active_sessions": len(self._sessions),
+                "avg_response_time": round(avg_time, 3),
+                "popular_topics": [
+                    {"topic": t, "count": c} for t, c in sorted_topics
+                ],
+                "recent_queries": list(self._recent_queries)[-10:],
+            }
 
 
 # Global singleton
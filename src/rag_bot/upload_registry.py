@@ -0,0 +1,78 @@
+"""
+Registry of uploaded file contents (sha256 -> vendor, filename, chunk ids).
+
+Lets /upload recognise a re-upload of identical bytes and skip re-embedding.
+"""
+
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from rag_bot.config import UPLOAD_HASHES_DB
+
+
+class UploadRegistry:
+    """SQLite-backed map from content hash to the document it was ingested as."""
+
+    def __init__(self, path=UPLOAD_HASHES_DB):
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " sha256 TEXT PRIMARY KEY,"
+                " vendor TEXT NOT NULL,"
+                " filename TEXT NOT NULL,"
+                " chunk_ids TEXT NOT NULL)"
+            )
+
+    def lookup(self, sha256: str) -> Optional[Dict]:
+        """Return {"vendor", "filename", "chunk_ids"} for a known hash, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vendor, filename, chunk_ids FROM uploads WHERE sha256 = ?",
+                (sha256,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"vendor": row[0], "filename": row[1], "chunk_ids": json.loads(row[2])}
+
+    def record(self, sha256: str, vendor: str, filename: str, chunk_ids: List[str]):
+        """
+        Record the content now indexed as (vendor, filename). Hashes of earlier
+        versions of that document are dropped, so re-uploading an old version
+        is ingested again instead of being skipped as a duplicate.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM uploads WHERE vendor = ? AND filename = ?", (vendor, filename)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (sha256, vendor, filename, chunk_ids)"
+                " VALUES (?, ?, ?, ?)",
+                (sha256, vendor, filename, json.dumps(chunk_ids)),
+            )
+
+    def update_vendor(self, sha256: str, vendor: str):
+        """Move a hash to a new vendor, replacing whatever that vendor had under the same filename."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM uploads WHERE vendor = ? AND sha256 != ? AND filename ="
+                " (SELECT filename FROM uploads WHERE sha256 = ?)",
+                (vendor, sha256, sha256),
+            )
+            self._conn.execute(
+                "UPDATE uploads SET vendor = ? WHERE sha256 = ?", (vendor, sha256)
+            )
+
+    def forget_document(self, vendor: str, filename: str):
+        """Drop entries for a document removed from the index."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM uploads WHERE vendor = ? AND filename = ?", (vendor, filename)
+            )
+
+
+# Global singleton
+upload_registry = UploadRegistry()